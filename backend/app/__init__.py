@@ -1,24 +1,68 @@
 from flask import Flask
 from flask_cors import CORS
 from dotenv import load_dotenv
+from sqlalchemy import event
+from logging.handlers import QueueHandler, QueueListener
+import atexit
 import logging
+import os
+import queue
 from app.extensions import db, api
-from app.resources.restaurant_ratings import RestaurantRatings, RestaurantRating, Average_Ratings, Average_Rating, UserRatings
-
-# Initialize logging early to capture all logs
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-)
+from app.resources.restaurant_ratings import RestaurantRatings, BulkRestaurantRatings, RestaurantRating, Average_Ratings, Average_Rating, UserRatings
 
 # Register resources
 api.add_resource(RestaurantRatings, '/api/ratings/')
+api.add_resource(BulkRestaurantRatings, '/api/ratings/bulk')
 api.add_resource(RestaurantRating, '/api/ratings/<int:id>')
 api.add_resource(Average_Ratings, '/api/ratings/average_ratings/')
 api.add_resource(Average_Rating, '/api/ratings/average_ratings/<string:restaurant_name>')
 api.add_resource(UserRatings, '/api/users/<int:user_id>/ratings/')
 
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Tune every new SQLite connection for concurrent reads and cheap commits.
+
+    WAL lets readers proceed while a write is in progress, and synchronous=NORMAL
+    is durable in WAL mode while skipping the fsync on every commit.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+_log_listener = None
+
+def _configure_logging():
+    """
+    Route log records through a queue so handler I/O happens on a background thread.
+
+    Request threads only enqueue records; a QueueListener formats and writes them
+    to stderr. Logs at INFO unless LOG_LEVEL says otherwise (e.g. LOG_LEVEL=DEBUG
+    in development), so production doesn't emit every debug record.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    root.addHandler(QueueHandler(log_queue))
+
+    _log_listener = QueueListener(log_queue, handler)
+    _log_listener.start()
+    # Flush queued records on shutdown
+    atexit.register(_log_listener.stop)
+
 
 def create_app():
     app = Flask(__name__)
@@ -26,18 +70,27 @@ def create_app():
 
     load_dotenv()
 
+    _configure_logging()
+
     # Configure database
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///../instance/database.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Keep a few pooled connections so reads don't queue behind the writer, and
+    # enough compiled-statement cache entries for every filter combination
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': 5, 'max_overflow': 10, 'query_cache_size': 1200}
 
     # Initialize extensions with app
     db.init_app(app)
     api.init_app(app)
 
+    with app.app_context():
+        event.listen(db.engine, 'connect', _set_sqlite_pragmas)
+
     # Diagnostic: Print all registered routes
-    logging.debug("Registered Routes:")
-    for rule in app.url_map.iter_rules():
-        methods = ','.join(sorted(rule.methods - {'OPTIONS', 'HEAD'}))
-        logging.debug(f"{rule} -> {rule.endpoint} [{methods}]")
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("Registered Routes:")
+        for rule in app.url_map.iter_rules():
+            methods = ','.join(sorted(rule.methods - {'OPTIONS', 'HEAD'}))
+            logging.debug("%s -> %s [%s]", rule, rule.endpoint, methods)
 
     return app
@@ -1,7 +1,30 @@
 # Initializes all Flask extensions, without binding them to the Flask app instance.
 
+from flask import current_app, make_response, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_restful import Api
+import hashlib
+import orjson
 
-db = SQLAlchemy()
-api = Api()
\ No newline at end of file
+# Keep loaded attributes after commit so responses can be built without reloading each row
+db = SQLAlchemy(session_options={'expire_on_commit': False})
+api = Api()
+
+@api.representation('application/json')
+def output_json(data, code, headers=None):
+    """Encode resource responses with orjson, which also serializes datetimes natively."""
+    # Stored datetimes are naive UTC; label them as such ("+00:00") in the output
+    option = orjson.OPT_APPEND_NEWLINE | orjson.OPT_NAIVE_UTC
+    if current_app.debug:
+        option |= orjson.OPT_INDENT_2
+    body = orjson.dumps(data, option=option)
+    resp = make_response(body, code)
+    resp.headers.extend(headers or {})
+
+    if code == 200 and request.method in ('GET', 'HEAD'):
+        # Tag reads by content, so the tag agrees across worker processes; a client
+        # revalidating with If-None-Match gets an empty 304 when nothing changed
+        resp.set_etag(hashlib.blake2b(body, digest_size=16).hexdigest())
+        resp.headers['Cache-Control'] = 'private, no-cache'
+        resp.make_conditional(request)
+    return resp
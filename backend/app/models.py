@@ -1,46 +1,117 @@
 from app.extensions import db
 from datetime import datetime, timezone
+from typing import List, Optional
+from sqlalchemy import DDL, ForeignKey, String, UniqueConstraint, column, event, func, table
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
+from app.utils.address import extract_city
+
+def utcnow():
+    """Current UTC time as a naive datetime, matching how SQLite stores DateTime columns."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 class UserModel(db.Model): 
     __tablename__ = 'user_model'
     
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(80), unique=True, nullable=False)
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(80), unique=True)
+    email: Mapped[str] = mapped_column(String(80), unique=True)
 
-    ratings = db.relationship('RestaurantRatingModel', backref='user', lazy=True)
+    # Ratings are loaded with an explicit query where needed; an unplanned lazy load raises
+    ratings: Mapped[List['RestaurantRatingModel']] = relationship(back_populates='user', lazy='raise')
 
     def __repr__(self): 
         return f"User(name={self.name}, email={self.email})"
 
 class RestaurantRatingModel(db.Model):
     __tablename__ = 'restaurant_rating_model'
+    __table_args__ = (
+        # Serve the type/rating-range filters and the per-restaurant aggregates
+        # (a covering index scan for GROUP BY restaurant_name)
+        db.Index('ix_rating_type_rating', 'restaurant_type', 'rating'),
+        db.Index('ix_rating_name_rating', 'restaurant_name', 'rating'),
+        db.Index('ix_rating_user_id', 'user_id'),
+    )
     
-    id = db.Column(db.Integer, primary_key=True)
-    restaurant_name = db.Column(db.String(100), nullable=False)
-    restaurant_type = db.Column(db.String(120), nullable=False)
-    restaurant_address = db.Column(db.String(150), nullable=False)
-    rating = db.Column(db.Integer, nullable=False)
-    meal = db.Column(db.String, nullable=False)
-    calories = db.Column(db.Integer, nullable=False)
-    date_posted = db.Column(db.DateTime, default=datetime.now(timezone.utc), nullable=False)
-    city = db.Column(db.String(100), nullable=False)
+    id: Mapped[int] = mapped_column(primary_key=True)
+    restaurant_name: Mapped[str] = mapped_column(String(100))
+    restaurant_type: Mapped[str] = mapped_column(String(120))
+    restaurant_address: Mapped[str] = mapped_column(String(150))
+    rating: Mapped[int]
+    meal: Mapped[str]
+    calories: Mapped[int]
+    # The database fills this in for rows inserted outside the ORM; the callable covers
+    # databases created before the server default existed
+    date_posted: Mapped[datetime] = mapped_column(default=utcnow, server_default=func.now())
+    city: Mapped[str] = mapped_column(String(100))
     
     # Associate with the user
-    user_id = db.Column(db.Integer, db.ForeignKey('user_model.id'), nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey('user_model.id'))
+    user: Mapped['UserModel'] = relationship(back_populates='ratings')
     
-    # Dynamic attribute for events
-    _events = None
+    # Nearby events, cached from Ticketmaster
+    events: Mapped[List['EventModel']] = relationship(back_populates='rating', lazy='selectin', cascade='all, delete-orphan')
 
     def __repr__(self):
         return f"RestaurantRating(restaurant_name={self.restaurant_name}, rating={self.rating})"
-    
-    @property
-    def events(self):
-        """Dynamic property to hold events data."""
-        return self._events if self._events else []
-    
-    @events.setter
-    def events(self, value):
-        """Setter for the dynamic events property."""
-        self._events = value
+
+    @validates('restaurant_address')
+    def _sync_city(self, key, address):
+        """Derive city whenever the address is set, so the two can't drift apart."""
+        city = extract_city(address)
+        if city != self.city:
+            # Stored events belong to the old city
+            self.events = []
+        self.city = city
+        return address
+
+# Expression index for the case-insensitive restaurant name lookup
+db.Index('ix_rating_name_lower', func.lower(RestaurantRatingModel.restaurant_name))
+
+# Substring search on restaurant_name ('%name%') can't use a btree index.
+# PostgreSQL serves it from a pg_trgm GIN index; SQLite from an FTS5 trigram table
+# that shadows the column and is kept in sync by triggers.
+db.Index(
+    'ix_rating_name_trgm', RestaurantRatingModel.restaurant_name,
+    postgresql_using='gin', postgresql_ops={'restaurant_name': 'gin_trgm_ops'},
+).ddl_if(dialect='postgresql')
+event.listen(
+    db.metadata, 'before_create',
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect='postgresql'),
+)
+
+restaurant_name_fts = table('restaurant_name_fts', column('rowid'), column('restaurant_name'))
+
+for statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS restaurant_name_fts USING fts5("
+    "restaurant_name, content='restaurant_rating_model', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS restaurant_name_fts_ai AFTER INSERT ON restaurant_rating_model BEGIN "
+    "INSERT INTO restaurant_name_fts(rowid, restaurant_name) VALUES (new.id, new.restaurant_name); END",
+    "CREATE TRIGGER IF NOT EXISTS restaurant_name_fts_ad AFTER DELETE ON restaurant_rating_model BEGIN "
+    "INSERT INTO restaurant_name_fts(restaurant_name_fts, rowid, restaurant_name) VALUES ('delete', old.id, old.restaurant_name); END",
+    "CREATE TRIGGER IF NOT EXISTS restaurant_name_fts_au AFTER UPDATE OF restaurant_name ON restaurant_rating_model BEGIN "
+    "INSERT INTO restaurant_name_fts(restaurant_name_fts, rowid, restaurant_name) VALUES ('delete', old.id, old.restaurant_name); "
+    "INSERT INTO restaurant_name_fts(rowid, restaurant_name) VALUES (new.id, new.restaurant_name); END",
+    # Index any rows written before the search table existed
+    "INSERT INTO restaurant_name_fts(restaurant_name_fts) VALUES ('rebuild')",
+):
+    event.listen(db.metadata, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+class EventModel(db.Model):
+    __tablename__ = 'event_model'
+    # A rating holds each Ticketmaster event once; the constraint also serves lookups by rating_id
+    __table_args__ = (
+        UniqueConstraint('rating_id', 'ticketmaster_id', name='uq_event_rating_ticketmaster'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    ticketmaster_id: Mapped[str] = mapped_column(String(64))
+    name: Mapped[Optional[str]] = mapped_column(String(255))
+    url: Mapped[Optional[str]] = mapped_column(String(500))
+    fetched_at: Mapped[datetime]
+
+    # Associate with the rating
+    rating_id: Mapped[int] = mapped_column(ForeignKey('restaurant_rating_model.id'))
+    rating: Mapped['RestaurantRatingModel'] = relationship(back_populates='events')
+
+    def __repr__(self):
+        return f"Event(name={self.name}, rating_id={self.rating_id})"
@@ -1,8 +1,15 @@
-from flask_restful import Resource, reqparse, marshal_with, abort, fields
-from sqlalchemy import func
-from app.models import RestaurantRatingModel, UserModel
-from app.utils.helpers import extract_city, fetch_and_assign_events
-from app.extensions import db
+from types import SimpleNamespace
+from urllib.parse import urlencode
+import threading
+from cachetools import TTLCache
+from flask import current_app, request
+from flask_restful import Resource, reqparse, abort, inputs
+from sqlalchemy import exists, func, lambda_stmt, select
+from sqlalchemy.orm import lazyload
+from app.models import RestaurantRatingModel, UserModel, restaurant_name_fts
+from app.utils.address import extract_city
+from app.utils.helpers import bulk_insert_ratings, fetch_and_assign_events, fetch_and_assign_events_bulk, fetch_events_in_background
+from app.extensions import db, api
 import logging
 
 # POST Parser
@@ -17,6 +24,23 @@ rating_post_args.add_argument('user_id', type=int, required=False, help="ID of t
 rating_post_args.add_argument('name', type=str, required=False, help="Name of the user (required if user_id is not provided)")
 rating_post_args.add_argument('email', type=str, required=False, help="Email of the user (required if user_id is not provided)")
 
+# How long POST waits for its background event fetch before responding without events
+EVENTS_WAIT_SECONDS = 1.0
+
+# List paging bounds
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+# GET Parser (list filters)
+rating_get_args = reqparse.RequestParser()
+rating_get_args.add_argument('restaurant_name', type=str, location='args')
+rating_get_args.add_argument('restaurant_type', type=str, location='args')
+rating_get_args.add_argument('min_rating', type=int, location='args')
+rating_get_args.add_argument('max_rating', type=int, location='args')
+rating_get_args.add_argument('limit', type=inputs.positive, location='args', help="Limit must be a positive integer")
+rating_get_args.add_argument('offset', type=inputs.natural, location='args', help="Offset must be a non-negative integer")
+rating_get_args.add_argument('include', type=str, location='args', help="Comma-separated extras to include, e.g. events")
+
 # PATCH Parser
 rating_patch_args = reqparse.RequestParser()
 rating_patch_args.add_argument('restaurant_name', type=str, required=False)
@@ -26,111 +50,247 @@ rating_patch_args.add_argument('rating', type=int, required=False, choices=[1,2,
 rating_patch_args.add_argument('meal', type=str, required=False)
 rating_patch_args.add_argument('calories', type=int, required=False)
 
-# Output Fields
-event_fields = {
-    'id': fields.String(attribute='id'),
-    'name': fields.String(attribute='name'),
-    'url': fields.String(attribute='url'),
-}
-
-rating_fields = {
-    'id': fields.Integer,
-    'restaurant_name': fields.String,
-    'restaurant_type': fields.String,
-    'restaurant_address': fields.String,
-    'rating': fields.Integer,
-    'meal': fields.String,
-    'calories': fields.Integer,
-    'user_id': fields.Integer,
-    'date_posted': fields.DateTime(dt_format='iso8601'),
-    'events': fields.List(fields.Nested(event_fields)),
-}
-
-average_rating_fields = {
-    'restaurant_name': fields.String,
-    'average_rating': fields.Float
-}
+# Average ratings only change on writes, so cache them keyed by a counter that
+# every write bumps; the TTL bounds staleness across worker processes.
+_ratings_version = 0
+_average_ratings_cache = TTLCache(maxsize=1, ttl=30)
+_average_ratings_lock = threading.Lock()
+
+def _bump_ratings_version():
+    """Invalidate cached aggregates after ratings are added, changed or removed."""
+    global _ratings_version
+    with _average_ratings_lock:
+        _ratings_version += 1
+
+# Output Serializers
+# Plain functions build each response dict in one pass, instead of walking a
+# flask_restful field map per attribute for every row.
+def serialize_event(event):
+    """Convert a stored EventModel into its API representation."""
+    return {
+        'id': event.ticketmaster_id,
+        'name': event.name,
+        'url': event.url,
+    }
+
+def serialize_rating_basic(rating):
+    """Convert a RestaurantRatingModel into its API representation, without events."""
+    return {
+        'id': rating.id,
+        'restaurant_name': rating.restaurant_name,
+        'restaurant_type': rating.restaurant_type,
+        'restaurant_address': rating.restaurant_address,
+        'rating': rating.rating,
+        'meal': rating.meal,
+        'calories': rating.calories,
+        'user_id': rating.user_id,
+        'date_posted': rating.date_posted,
+    }
+
+def serialize_rating(rating):
+    """Convert a RestaurantRatingModel, including its events, into its API representation."""
+    data = serialize_rating_basic(rating)
+    data['events'] = [serialize_event(event) for event in rating.events]
+    return data
+
+def wants_events(args):
+    """Whether a list request opted in to events with ?include=events."""
+    return 'events' in (args['include'] or '').split(',')
+
+def restaurant_name_contains(name):
+    """Case-insensitive substring filter on restaurant_name that can use the trigram search index."""
+    pattern = f"%{name}%"
+    if db.engine.dialect.name == 'sqlite':
+        # Trigram FTS5 answers LIKE case-insensitively from its own index
+        return RestaurantRatingModel.id.in_(
+            select(restaurant_name_fts.c.rowid).where(restaurant_name_fts.c.restaurant_name.like(pattern))
+        )
+    return RestaurantRatingModel.restaurant_name.ilike(pattern)
+
+def _paging_headers(total, limit, offset):
+    """Build the X-Total-Count and Link (next/prev) headers for a page of list results."""
+    def page_url(page_offset):
+        return f"{request.base_url}?{urlencode(dict(request.args.to_dict(), limit=limit, offset=page_offset))}"
+
+    links = []
+    if offset + limit < total:
+        links.append(f'<{page_url(offset + limit)}>; rel="next"')
+    if offset > 0:
+        links.append(f'<{page_url(max(offset - limit, 0))}>; rel="prev"')
+
+    headers = {'X-Total-Count': str(total)}
+    if links:
+        headers['Link'] = ', '.join(links)
+    return headers
+
+def filtered_ratings_page(stmt, args):
+    """
+    Apply the shared list filters and paging from rating_get_args to a ratings query.
+
+    Args:
+        stmt (Select): A select of RestaurantRatingModel, possibly already narrowed.
+        args (dict): Parsed rating_get_args.
+
+    Returns:
+        tuple: The page of ratings (newest first), the total number of matches,
+        and the paging headers.
+    """
+    # Types of filters that can be applied
+    if args['restaurant_name']:
+        stmt = stmt.where(restaurant_name_contains(args['restaurant_name']))
+    if args['restaurant_type']:
+        # Types are a small fixed set, so match exactly and let the index do the work
+        stmt = stmt.where(RestaurantRatingModel.restaurant_type == args['restaurant_type'])
+    if args['min_rating']:
+        stmt = stmt.where(RestaurantRatingModel.rating >= args['min_rating'])
+    if args['max_rating']:
+        stmt = stmt.where(RestaurantRatingModel.rating <= args['max_rating'])
+    if not wants_events(args):
+        # Events weren't asked for, so skip their selectin load
+        stmt = stmt.options(lazyload(RestaurantRatingModel.events))
+
+    total = db.session.execute(select(func.count()).select_from(stmt.subquery())).scalar_one()
+
+    # Page in SQL, newest first, so at most MAX_PAGE_SIZE rows are loaded and get events attached
+    limit = min(args['limit'] or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    offset = args['offset'] or 0
+    stmt = stmt.order_by(RestaurantRatingModel.id.desc()).limit(limit).offset(offset)
+
+    ratings = db.session.execute(stmt).scalars().all()
+    return ratings, total, _paging_headers(total, limit, offset)
+
+def get_rating_or_404(id):
+    """Look up a restaurant rating by primary key, aborting with 404 if it does not exist."""
+    rating = db.session.get(RestaurantRatingModel, id)
+    if not rating:
+        abort(404, message='Restaurant rating not found.')
+    return rating
 
 
 class RestaurantRatings(Resource):
     """
     Resource for handling multiple restaurant ratings.
-    - POST: Add a new restaurant rating and fetch nearby events.
+    - POST: Add a new restaurant rating and fetch nearby events in the background.
     - GET: Retrieve a list of restaurant ratings with optional filters.
     """
-    @marshal_with(rating_fields)
     def post(self):
         '''
-        Add a new restaurant rating and fetch nearby events.
+        Add a new restaurant rating and fetch nearby events in the background.
+
+        The rating is committed before events are fetched. If the fetch finishes
+        within EVENTS_WAIT_SECONDS the response includes the events; otherwise its
+        events list is empty and they appear on the rating's GET endpoint, which the
+        Location header points to.
 
         Returns:
-            dict: A dictionary containing the restaurant rating and nearby events.
+            dict: A dictionary containing the new restaurant rating.
         '''
         args = rating_post_args.parse_args()
-        address = args['restaurant_address']
-        
-        # Extract city from address
-        city = extract_city(address)
-        if not city:
-            abort(400, message="Could not extract city from address.")
         
-        # Create new RestaurantRating instance
+        # Create new RestaurantRating instance; city is derived from the address
         new_rating = RestaurantRatingModel(
             restaurant_name=args['restaurant_name'],
             restaurant_type=args['restaurant_type'],
-            restaurant_address=address,
+            restaurant_address=args['restaurant_address'],
             rating=args['rating'],
             meal=args['meal'],
             calories=args['calories'],
             user_id=args.get('user_id'),
-            city=city
         )
+        if not new_rating.city:
+            abort(400, message="Could not extract city from address.")
         
         db.session.add(new_rating)
         db.session.commit()
+        _bump_ratings_version()
         
-        # Fetch and assign events using the helper function
-        fetch_and_assign_events(new_rating)
+        # Fetch events off the request thread; the client waits on Ticketmaster only briefly
+        future = fetch_events_in_background(current_app._get_current_object(), new_rating.id)
+        try:
+            future.result(timeout=EVENTS_WAIT_SECONDS)
+        except TimeoutError:
+            pass
+        else:
+            # The events were committed by the worker's session; load them into this one
+            db.session.refresh(new_rating, ['events'])
         
-        return new_rating, 201
+        location = api.url_for(RestaurantRating, id=new_rating.id)
+        return serialize_rating(new_rating), 201, {'Location': location}
 
-    @marshal_with(rating_fields)
     def get(self):
         """
         Retrieve all restaurant ratings with optional filtering.
         Supports filters:
+            - restaurant_name
             - restaurant_type
             - min_rating
             - max_rating
+        Supports paging, newest first:
+            - limit (default 25, at most 100)
+            - offset
+        Related events are only fetched and included with include=events.
 
         Returns:
-            list: A list of restaurant ratings with optional filters applied. 
+            list: A page of restaurant ratings with optional filters applied. The
+            X-Total-Count and Link headers describe the full result set.
         """
-        parser = reqparse.RequestParser()
-        parser.add_argument('restaurant_name', type=str, location='args')
-        parser.add_argument('restaurant_type', type=str, location='args')
-        parser.add_argument('min_rating', type=int, location='args')
-        parser.add_argument('max_rating', type=int, location='args')
-        args = parser.parse_args()
+        args = rating_get_args.parse_args()
+        ratings, _, headers = filtered_ratings_page(select(RestaurantRatingModel), args)
 
-        query = RestaurantRatingModel.query
+        if not wants_events(args):
+            return [serialize_rating_basic(rating) for rating in ratings], 200, headers
 
-        # Types of filters that can be applied
-        if args['restaurant_name']:
-            query = query.filter(RestaurantRatingModel.restaurant_name.ilike(f"%{args['restaurant_name']}%"))
-        if args['restaurant_type']:
-            query = query.filter(RestaurantRatingModel.restaurant_type.ilike(f"%{args['restaurant_type']}%"))
-        if args['min_rating']:
-            query = query.filter(RestaurantRatingModel.rating >= args['min_rating'])
-        if args['max_rating']:
-            query = query.filter(RestaurantRatingModel.rating <= args['max_rating'])
+        # One Ticketmaster lookup per distinct city rather than per rating
+        fetch_and_assign_events_bulk(ratings)
+        
+        return [serialize_rating(rating) for rating in ratings], 200, headers
 
-        ratings = query.all()
+class BulkRestaurantRatings(Resource):
+    """
+    Resource for importing many restaurant ratings at once.
+    - POST: Add a list of restaurant ratings in a single transaction.
+    """
+    def post(self):
+        '''
+        Add a list of restaurant ratings in a single transaction.
 
-        for rating in ratings:
-            fetch_and_assign_events(rating)
-        
-        return ratings, 200
+        Each item is validated with the same rules as a single POST. Nearby
+        events are not fetched for bulk imports.
+
+        Returns:
+            dict: A dictionary containing the number of ratings created.
+        '''
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, list) or not payload:
+            abort(400, message="Request body must be a non-empty JSON array of ratings.")
+
+        rows = []
+        for index, item in enumerate(payload):
+            if not isinstance(item, dict):
+                abort(400, message=f"Rating at index {index} must be a JSON object.")
+            args = rating_post_args.parse_args(req=SimpleNamespace(json=item))
+
+            # Core inserts bypass the model's address validator, so derive the city here
+            city = extract_city(args['restaurant_address'])
+            if not city:
+                abort(400, message=f"Could not extract city from address of rating at index {index}.")
+
+            rows.append({
+                'restaurant_name': args['restaurant_name'],
+                'restaurant_type': args['restaurant_type'],
+                'restaurant_address': args['restaurant_address'],
+                'rating': args['rating'],
+                'meal': args['meal'],
+                'calories': args['calories'],
+                'user_id': args.get('user_id'),
+                'city': city,
+            })
+
+        # One multi-row INSERT and one commit for the whole batch
+        bulk_insert_ratings(rows)
+        _bump_ratings_version()
+
+        return {'message': 'Created', 'count': len(rows)}, 201
 
 class RestaurantRating(Resource):
     """
@@ -139,7 +299,6 @@ class RestaurantRating(Resource):
     - PATCH: Update fields of a specific restaurant rating.
     - DELETE: Delete a specific restaurant rating by ID.
     """
-    @marshal_with(rating_fields)
     def get(self, id):
         '''
         Retrieve restaurant rating by ID along with related events.
@@ -150,15 +309,12 @@ class RestaurantRating(Resource):
         Returns:
             dict: A dictionary containing the restaurant rating and related events.
         '''
-        rating = RestaurantRatingModel.query.filter_by(id=id).first()
-        if not rating:
-            abort(404, message='Restaurant rating not found.')
+        rating = get_rating_or_404(id)
         
         fetch_and_assign_events(rating)
         
-        return rating, 200
+        return serialize_rating(rating), 200
     
-    @marshal_with(rating_fields)
     def patch(self, id):
         '''
         Update fields of a restaurant rating.
@@ -170,9 +326,8 @@ class RestaurantRating(Resource):
             dict: A dictionary containing the updated restaurant rating.
         '''
         args = rating_patch_args.parse_args()  # Use the PATCH parser
-        rating = RestaurantRatingModel.query.filter_by(id=id).first()
-        if not rating:
-            abort(404, message='Restaurant rating not found.')
+        rating = get_rating_or_404(id)
+        previous_city = rating.city
 
         # Update fields only if they are provided
         if args['restaurant_name']:
@@ -180,12 +335,9 @@ class RestaurantRating(Resource):
         if args['restaurant_type']:
             rating.restaurant_type = args['restaurant_type']
         if args['restaurant_address']:
+            # Setting the address re-derives the city
             rating.restaurant_address = args['restaurant_address']
-            # Re-extract city if address has changed
-            new_city = extract_city(rating.restaurant_address)
-            if new_city:
-                rating.city = new_city
-            else:
+            if not rating.city:
                 abort(400, message="Could not extract city from new address.")
         if args['rating']:
             rating.rating = args['rating']
@@ -195,13 +347,14 @@ class RestaurantRating(Resource):
             rating.calories = args['calories']
 
         db.session.commit()
+        _bump_ratings_version()
 
-        # Fetch and assign events using the helper function
-        fetch_and_assign_events(rating)
+        # Stored events stay valid unless the rating moved to another city
+        if rating.city != previous_city:
+            fetch_events_in_background(current_app._get_current_object(), rating.id)
 
-        return rating, 200
+        return serialize_rating(rating), 200
     
-    @marshal_with(rating_fields)
     def delete(self, id):
         '''
         Delete a restaurant rating by ID
@@ -212,11 +365,10 @@ class RestaurantRating(Resource):
         Returns:
             dict: A dictionary containing a message indicating the deletion status.
         '''
-        rating = RestaurantRatingModel.query.filter_by(id=id).first()
-        if not rating:
-            abort(404, message='Restaurant rating not found.')
+        rating = get_rating_or_404(id)
         db.session.delete(rating)
         db.session.commit()
+        _bump_ratings_version()
         return {'message': 'Deleted'}, 200
 
 class Average_Ratings(Resource):
@@ -231,96 +383,109 @@ class Average_Ratings(Resource):
         Returns:
             list: A list of dictionaries containing restaurant names and their average ratings.
         """
+        version = _ratings_version
+        with _average_ratings_lock:
+            result = _average_ratings_cache.get(version)
+        if result is not None:
+            return result, 200
+
         try:
-            # Query to calculate average rating per restaurant
-            aggregation = db.session.query(
+            # Query to calculate the rounded average rating per restaurant
+            aggregation = db.session.execute(select(
                 RestaurantRatingModel.restaurant_name,
-                func.avg(RestaurantRatingModel.rating).label('average_rating')
-            ).group_by(RestaurantRatingModel.restaurant_name).all()
-
-            result = []
-            for agg in aggregation:
-                result.append({
-                    'restaurant_name': agg.restaurant_name,
-                    'average_rating': round(agg.average_rating, 2) if agg.average_rating else None,
-                })
+                func.round(func.avg(RestaurantRatingModel.rating), 2).label('average_rating')
+            ).group_by(RestaurantRatingModel.restaurant_name)).all()
 
-            return result, 200
+            result = [
+                {'restaurant_name': agg.restaurant_name, 'average_rating': agg.average_rating}
+                for agg in aggregation
+            ]
         except Exception as e:
-            logging.error(f"Error retrieving aggregated data: {e}")
+            logging.error("Error retrieving aggregated data: %s", e)
             abort(500, message="Internal server error while retrieving aggregated data.")
 
+        with _average_ratings_lock:
+            _average_ratings_cache[version] = result
+        return result, 200
+
 class Average_Rating(Resource):
     """
     Resource for retrieving the average rating of a specific restaurant.
     - GET: Retrieve the average rating for the given restaurant_name.
     """
-    @marshal_with(average_rating_fields)
     def get(self, restaurant_name):
         """
         Retrieve the average rating for a specific restaurant.
 
+        The name is matched ignoring case, and ratings whose names differ only in
+        case are averaged together.
+
         Args:
             restaurant_name (str): The name of the restaurant.
 
         Returns:
-            dict: A dictionary containing the restaurant name and its average rating.
+            dict: A dictionary containing the restaurant name, as requested, and its average rating.
         """
         try:
-            # Query to calculate average rating for the specified restaurant_name
-            aggregation = db.session.query(
-                RestaurantRatingModel.restaurant_name,
-                func.avg(RestaurantRatingModel.rating).label('average_rating')
-            ).filter(
-                RestaurantRatingModel.restaurant_name.ilike(f"%{restaurant_name}%")
-            ).group_by(
-                RestaurantRatingModel.restaurant_name
-            ).first()
-
-            if not aggregation:
-                abort(404, message=f"No ratings found for restaurant '{restaurant_name}'.")
-
-            # Round the average rating to two decimal places
-            average_rating = round(aggregation.average_rating, 2) if aggregation.average_rating else None
-
-            return {
-                'restaurant_name': aggregation.restaurant_name,
-                'average_rating': average_rating
-            }, 200
-
+            # Query to calculate the rounded average rating over every case variant of restaurant_name.
+            # The case-insensitive exact match is served by the lower(restaurant_name)
+            # index, and as a lambda statement the SQL is built once and only the name is re-bound.
+            # Both sides go through the database's lower(), which may fold case differently
+            # from Python's str.lower() (SQLite only folds ASCII).
+            name = restaurant_name
+            stmt = lambda_stmt(lambda: select(
+                func.count().label('rating_count'),
+                func.round(func.avg(RestaurantRatingModel.rating), 2).label('average_rating')
+            ).where(
+                func.lower(RestaurantRatingModel.restaurant_name) == func.lower(name)
+            ))
+            aggregation = db.session.execute(stmt).one()
         except Exception as e:
-            logging.error(f"Error retrieving average rating for '{restaurant_name}': {e}")
+            logging.error("Error retrieving average rating for '%s': %s", restaurant_name, e)
             abort(500, message="Internal server error while retrieving average rating.")
 
+        if not aggregation.rating_count:
+            abort(404, message=f"No ratings found for restaurant '{restaurant_name}'.")
+
+        return {
+            'restaurant_name': restaurant_name,
+            'average_rating': aggregation.average_rating
+        }, 200
+
 class UserRatings(Resource):
     """
     Resource for retrieving all restaurant ratings submitted by a specific user.
     - GET: Retrieve all ratings posted by the given user_id.
     """
-    @marshal_with(rating_fields)
     def get(self, user_id):
         """
         Retrieve all restaurant ratings submitted by a specific user.
+        Supports the same filters, paging and include=events as the ratings list.
         
         Args:
             user_id (int): The ID of the user.
         
         Returns:
-            list: A list of restaurant ratings submitted by the user.
+            list: A page of restaurant ratings submitted by the user. The
+            X-Total-Count and Link headers describe the full result set.
         """
-        # Check if the user exists
-        user = UserModel.query.filter_by(id=user_id).first()
-        if not user:
+        args = rating_get_args.parse_args()
+
+        # SELECT 1 is enough to 404; the user row itself isn't needed
+        if not db.session.execute(select(exists().where(UserModel.id == user_id))).scalar():
             abort(404, message=f"User with id '{user_id}' not found.")
         
-        # Retrieve all ratings submitted by the user
-        user_ratings = RestaurantRatingModel.query.filter_by(user_id=user_id).all()
+        user_ratings, total, headers = filtered_ratings_page(
+            select(RestaurantRatingModel).where(RestaurantRatingModel.user_id == user_id), args
+        )
         
-        if not user_ratings:
+        if not total:
             abort(404, message=f"No ratings found for user with id '{user_id}'.")
+
+        if not wants_events(args):
+            return [serialize_rating_basic(rating) for rating in user_ratings], 200, headers
         
-        # Assign events to each rating using the helper function
-        for rating in user_ratings:
-            fetch_and_assign_events(rating)
+        # One Ticketmaster lookup per distinct city rather than per rating
+        fetch_and_assign_events_bulk(user_ratings)
         
-        return user_ratings, 200
+        return [serialize_rating(rating) for rating in user_ratings], 200, headers
@@ -1,13 +1,45 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cachetools import TTLCache, cached
+from cachetools.keys import hashkey
 import os
 import logging
-
-logging.basicConfig(level=logging.DEBUG)
+import threading
 
 TICKETMASTER_API_KEY = os.getenv('TICKETMASTER_API_KEY')
 BASE_URL = 'https://app.ticketmaster.com/discovery/v2/'
 
+# (connect, read) timeouts in seconds, so a slow Ticketmaster response can't stall a worker
+REQUEST_TIMEOUT = (2, 5)
+
+# Upper bound on in-flight Ticketmaster requests; callers size their worker pools to match
+MAX_CONCURRENT_REQUESTS = 32
+
+# Shared session: keeps connections alive across calls so each lookup skips the TCP/TLS handshake
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=MAX_CONCURRENT_REQUESTS,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    ),
+))
+
+# Successful searches are reused for 5 minutes; failures are never cached
+_search_cache = TTLCache(maxsize=1024, ttl=300)
+_search_cache_lock = threading.RLock()
+
 
+@cached(
+    _search_cache,
+    key=lambda city, max_events=3, classificationName=None: hashkey(city, max_events, classificationName),
+    lock=_search_cache_lock,
+)
 def search_events(city, max_events=3, classificationName=None):
     """
     Search for events in a specific city using the Ticketmaster API.
@@ -35,17 +67,17 @@ def search_events(city, max_events=3, classificationName=None):
         params['classificationName'] = classificationName
 
     try:
-        response = requests.get(endpoint, params=params)
+        response = _session.get(endpoint, params=params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         data = response.json()
         events = data.get('_embedded', {}).get('events', [])
-        logging.debug(f"Fetched {len(events)} events for city: {city}")
+        logging.debug("Fetched %d events for city: %s", len(events), city)
         return events[:max_events]
     except requests.exceptions.HTTPError as http_err:
-        logging.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
+        logging.error("HTTP error occurred: %s - Response: %s", http_err, response.text)
         raise Exception(f"Ticketmaster API HTTP error: {http_err}")
     except Exception as err:
-        logging.error(f"Error fetching events: {err}")
+        logging.error("Error fetching events: %s", err)
         raise Exception(f"An error occurred while fetching events: {err}")
 
 
@@ -68,13 +100,13 @@ def get_event_details(event_id):
     }
 
     try:
-        response = requests.get(endpoint, params=params)
+        response = _session.get(endpoint, params=params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         event_details = response.json()
         return event_details
     except requests.exceptions.HTTPError as http_err:
-        logging.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
+        logging.error("HTTP error occurred: %s - Response: %s", http_err, response.text)
         raise Exception(f"Ticketmaster API HTTP error: {http_err}")
     except Exception as err:
-        logging.error(f"Error fetching event details: {err}")
+        logging.error("Error fetching event details: %s", err)
         raise Exception(f"An error occurred while fetching event details: {err}")
@@ -0,0 +1,30 @@
+import logging
+import re
+from functools import lru_cache
+
+# Text between the first and second commas, i.e. "street, CITY, state"
+_CITY_RE = re.compile(r'[^,]*,([^,]*)')
+
+@lru_cache(maxsize=4096)
+def extract_city(address):
+    """
+    Extracts the city from a given address string.
+
+    Results are memoized, since the same restaurants are rated repeatedly.
+
+    Args:
+        address (str): The full address string.
+
+    Returns:
+        str or None: The extracted city or None if extraction fails.
+    """
+    try:
+        match = _CITY_RE.match(address)
+        # Assuming the city is the second part
+        if match is None:
+            logging.error("Address does not contain enough parts to extract city.")
+            return None
+        return match.group(1).strip()
+    except Exception as e:
+        logging.error("Error extracting city: %s", e)
+        return None
@@ -1,29 +1,82 @@
 import logging
-from app.services.ticketmaster_service import search_events
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from app.extensions import db
+from app.models import EventModel, RestaurantRatingModel, utcnow
+from app.services.ticketmaster_service import MAX_CONCURRENT_REQUESTS, search_events
 import requests
 import os
 
-def extract_city(address):
+# Shared pool for Ticketmaster lookups; the calls are I/O-bound so threads are enough.
+# Sized to the HTTP connection pool so every keep-alive connection can be in flight at once.
+_event_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix='ticketmaster')
+
+# Separate pool for post-response event refreshes, so they never starve the lookups they wait on
+_background_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='event-refresh')
+
+# Ratings with a background refresh queued or running; foreground reads leave them to it
+_pending_refreshes = set()
+_pending_refreshes_lock = threading.Lock()
+
+# How long stored events are served before Ticketmaster is asked again
+EVENTS_TTL = timedelta(hours=1)
+
+def _recent_events_by_city(cities, cutoff):
     """
-    Extracts the city from a given address string.
+    Find the most recent batch of events stored for any rating in each city.
 
     Args:
-        address (str): The full address string.
+        cities (list[str]): The cities to look up.
+        cutoff (datetime): Batches fetched before this time are ignored.
 
     Returns:
-        str or None: The extracted city or None if extraction fails.
+        dict: Maps each city with a recent batch to a (fetched_at, events) tuple.
     """
-    try:
-        parts = address.split(',')
-        # Assuming the city is the second part
-        if len(parts) < 2:
-            logging.error("Address does not contain enough parts to extract city.")
-            return None
-        city = parts[1].strip()
-        return city
-    except Exception as e:
-        logging.error(f"Error extracting city: {e}")
-        return None
+    rows = db.session.execute(
+        select(
+            RestaurantRatingModel.city,
+            EventModel.rating_id,
+            EventModel.fetched_at,
+            EventModel.ticketmaster_id,
+            EventModel.name,
+            EventModel.url,
+        )
+        .join(EventModel.rating)
+        .where(RestaurantRatingModel.city.in_(cities), EventModel.fetched_at >= cutoff)
+        .order_by(EventModel.fetched_at.desc(), EventModel.id)
+    ).all()
+
+    latest_rating_ids = {}
+    recent = {}
+    for row in rows:
+        # Rows are newest first, so the first rating seen per city holds its latest batch
+        if latest_rating_ids.setdefault(row.city, row.rating_id) != row.rating_id:
+            continue
+        fetched_at, events = recent.setdefault(row.city, (row.fetched_at, []))
+        events.append({'id': row.ticketmaster_id, 'name': row.name, 'url': row.url})
+    return recent
+
+def bulk_insert_ratings(rows):
+    """
+    Insert many ratings with one multi-row INSERT and a single commit.
+
+    The insert skips the ORM unit of work and the identity map, and autoflush is
+    disabled so unrelated pending objects aren't flushed along with it.
+
+    Args:
+        rows (list[dict]): Column mappings for RestaurantRatingModel, including city.
+
+    Returns:
+        None
+    """
+    with db.session.no_autoflush:
+        db.session.execute(insert(RestaurantRatingModel), rows)
+    db.session.commit()
 
 def fetch_and_assign_events(rating):
     """
@@ -35,10 +88,136 @@ def fetch_and_assign_events(rating):
     Returns:
         None
     """
+    fetch_and_assign_events_bulk([rating])
+
+def fetch_and_assign_events_bulk(ratings):
+    """
+    Refresh the stored events of every rating whose events are missing or stale.
+
+    Ratings with a background refresh still pending are skipped, so a client
+    polling right after POST doesn't start a second fetch for the same rating.
+
+    Args:
+        ratings (list[RestaurantRatingModel]): The restaurant rating instances.
+
+    Returns:
+        None
+    """
+    with _pending_refreshes_lock:
+        ratings = [rating for rating in ratings if rating.id not in _pending_refreshes]
+    _refresh_events(ratings)
+
+def _refresh_events(ratings):
+    """
+    Fetch and store events for the ratings whose events are missing or stale.
+
+    Stale ratings first reuse a recent batch stored for another rating in the
+    same city. Only the cities with no recent batch are sent to Ticketmaster,
+    once per distinct city and concurrently. If a lookup fails, the stored
+    events for that city are left unchanged.
+
+    Events are replaced with an explicit DELETE and INSERT in one transaction,
+    so two refreshes of the same rating racing each other leave one batch, not
+    both.
+
+    Args:
+        ratings (list[RestaurantRatingModel]): The restaurant rating instances.
+
+    Returns:
+        None
+    """
+    cutoff = utcnow() - EVENTS_TTL
+    ratings_by_city = defaultdict(list)
+    for rating in ratings:
+        if not rating.events or min(event.fetched_at for event in rating.events) < cutoff:
+            ratings_by_city[rating.city].append(rating)
+    if not ratings_by_city:
+        return
+
+    events_by_city = _recent_events_by_city(list(ratings_by_city), cutoff)
+
+    futures = {
+        city: _event_executor.submit(search_events, city=city, max_events=3, classificationName='Music')
+        for city in ratings_by_city if city not in events_by_city
+    }
+    fetched_at = utcnow()
+    for city, future in futures.items():
+        try:
+            events_by_city[city] = (fetched_at, future.result())
+            logging.debug("Fetched Events for city %s: %s", city, events_by_city[city][1])
+        except Exception as e:
+            logging.error("Error fetching events for city %s: %s", city, e)
+
+    if not events_by_city:
+        return
+
+    rating_ids = []
+    rows = []
+    for city, (batch_fetched_at, events) in events_by_city.items():
+        # Keyed by Ticketmaster id, so a repeated event is stored once per rating
+        batch = {event['id']: event for event in events if event.get('id')}
+        for rating in ratings_by_city[city]:
+            rating_ids.append(rating.id)
+            rows.extend(
+                {
+                    'rating_id': rating.id,
+                    'ticketmaster_id': event_id,
+                    'name': event.get('name'),
+                    'url': event.get('url'),
+                    'fetched_at': batch_fetched_at,
+                }
+                for event_id, event in batch.items()
+            )
+
+    try:
+        with db.session.no_autoflush:
+            db.session.execute(delete(EventModel).where(EventModel.rating_id.in_(rating_ids)))
+            if rows:
+                db.session.execute(insert(EventModel), rows)
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent refresh stored these ratings' events first; keep its batch
+        db.session.rollback()
+        logging.info("Events for ratings %s were refreshed concurrently", rating_ids)
+
+    # Load the stored events back onto the ratings in this session
+    db.session.execute(
+        select(RestaurantRatingModel)
+        .where(RestaurantRatingModel.id.in_(rating_ids))
+        .options(selectinload(RestaurantRatingModel.events))
+        .execution_options(populate_existing=True)
+    ).scalars().all()
+
+def fetch_events_in_background(app, rating_id):
+    """
+    Schedule an event refresh for a rating without blocking the caller.
+
+    Args:
+        app (Flask): The application, used to push an app context in the worker.
+        rating_id (int): The ID of the restaurant rating.
+
+    Returns:
+        Future: The scheduled refresh.
+    """
+    with _pending_refreshes_lock:
+        _pending_refreshes.add(rating_id)
     try:
-        events = search_events(city=rating.city, max_events=3, classificationName='Music')
-        rating.events = events
-        logging.debug(f"Fetched Events for rating ID {rating.id}: {events}")
-    except Exception as e:
-        logging.error(f"Error fetching events for rating ID {rating.id}: {e}")
-        rating.events = []
+        future = _background_executor.submit(_refresh_rating_events, app, rating_id)
+    except Exception:
+        with _pending_refreshes_lock:
+            _pending_refreshes.discard(rating_id)
+        raise
+    return future
+
+def _refresh_rating_events(app, rating_id):
+    """Load a rating in a fresh app context and refresh its events."""
+    with app.app_context():
+        try:
+            rating = db.session.get(RestaurantRatingModel, rating_id)
+            if rating:
+                _refresh_events([rating])
+        except Exception as e:
+            logging.error("Error refreshing events for rating ID %s: %s", rating_id, e)
+        finally:
+            with _pending_refreshes_lock:
+                _pending_refreshes.discard(rating_id)
@@ -1,8 +1,42 @@
+import json
+import sys
+from sqlalchemy import insert
 from app import create_app
 from app.extensions import db
+from app.models import UserModel
+from app.utils.address import extract_city
+from app.utils.helpers import bulk_insert_ratings
 
 app = create_app()
 
+def seed(path):
+    """
+    Load users and ratings from a JSON file of the form {"users": [...], "ratings": [...]}.
+
+    Each list is written with a single multi-row INSERT, inside one transaction.
+    """
+    with open(path) as f:
+        data = json.load(f)
+
+    ratings = data.get('ratings', [])
+    for rating in ratings:
+        rating['city'] = extract_city(rating['restaurant_address'])
+        if not rating['city']:
+            raise SystemExit(f"Could not extract city from address: {rating['restaurant_address']}")
+
+    with db.session.no_autoflush:
+        if data.get('users'):
+            db.session.execute(insert(UserModel), data['users'])
+    if ratings:
+        bulk_insert_ratings(ratings)
+    else:
+        db.session.commit()
+    print(f"Seeded {len(data.get('users', []))} users and {len(ratings)} ratings.")
+
 with app.app_context():
     db.create_all()
     print("Database tables created successfully.")
+
+    # Optional: python create_db.py seed.json
+    if len(sys.argv) > 1:
+        seed(sys.argv[1])
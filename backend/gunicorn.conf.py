@@ -0,0 +1,11 @@
+# Gunicorn settings for serving the API in production.
+# Requests spend most of their time waiting on SQLite and Ticketmaster, so each
+# worker process runs a pool of threads instead of handling one request at a time.
+
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = 30
@@ -0,0 +1,5 @@
+# Production entrypoint: gunicorn -c gunicorn.conf.py wsgi:app
+
+from app import create_app
+
+app = create_app()